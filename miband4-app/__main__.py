@@ -1,6 +1,7 @@
 import os
 import sys
 
+from . import _creds
 from .miband4_console import MiConsole 
 from .quick_call import call_quick
 
@@ -12,13 +13,26 @@ def main() -> None:
         # Set quick mode by default.
         mode = "q"
 
-    with open(os.path.dirname(__file__) + "/creds") as file:
-        mac, auth = file.readline().strip().split(";")
+    # Debug logging prints every band notification, so it's off by default.
+    debug = os.environ.get("MIBAND_DEBUG") == "1"
+
+    # Validate only creds used by chosen mode.
+    try:
+        if mode == "q":
+            mac = _creds.load_mac()
+        elif mode == "c":
+            mac, auth = _creds.load_creds()
+    except ValueError as error:
+        print("Error:")
+        print(f"  {error}")
+        if isinstance(error, _creds.AuthKeyError):
+            print("  Example of the Auth Key: 8fa9b42078627a654d22beff985655db")
+        exit(1)
 
     if mode == "q":
-        call_quick(mac)
+        call_quick(mac, debug=debug)
     elif mode == "c":
-        MiConsole(mac, auth)
+        MiConsole(mac, auth, debug=debug)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,67 @@
+"""Miband credentials parsed and validated once per process.
+
+Credentials are stored in the `creds` file as `<mac>;<auth key hex>`. The
+auth key may be omitted for features which work without it.
+"""
+import os
+from functools import lru_cache
+from typing import Tuple
+
+PATH = os.path.dirname(__file__) + "/creds"
+
+
+class AuthKeyError(ValueError):
+    """Given auth key doesn't fit preserved format."""
+    pass
+
+
+def parse_mac(mac: str) -> str:
+    """Validate given MAC address and return it.
+
+    Raise ValueError if MAC address doesn't fit preserved format.
+    """
+    if len(mac) != 17:
+        raise ValueError(
+            f"Given Miband4 MAC address {mac} doesn't fit preserved format"
+            " (len != 17)")
+    return mac
+
+
+@lru_cache(maxsize=None)
+def parse_auth(auth: str) -> bytes:
+    """Validate given auth key and return it in byte format.
+
+    Raise AuthKeyError if auth key doesn't fit preserved format.
+    """
+    if auth and len(auth) != 32:
+        raise AuthKeyError(
+            f"Given Miband4 auth key {auth} doesn't fit preserved format"
+            " (len != 32)")
+    try:
+        return bytes.fromhex(auth)
+    except ValueError:
+        raise AuthKeyError(
+            f"Given Miband4 auth key {auth} is not a hex string") from None
+
+
+@lru_cache(maxsize=None)
+def parse_creds(mac: str, auth: str) -> Tuple[str, bytes]:
+    """Validate given creds and return mac and auth key in byte format."""
+    return parse_mac(mac), parse_auth(auth)
+
+
+@lru_cache(maxsize=1)
+def _read(path: str) -> Tuple[str, str]:
+    with open(path) as file:
+        mac, _, auth = file.readline().strip().partition(";")
+    return mac, auth
+
+
+def load_mac(path: str = PATH) -> str:
+    """Read creds file at given path and return validated MAC address only."""
+    return parse_mac(_read(path)[0])
+
+
+def load_creds(path: str = PATH) -> Tuple[str, bytes]:
+    """Read creds file at given path and return parsed creds."""
+    return parse_creds(*_read(path))
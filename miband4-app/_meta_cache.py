@@ -0,0 +1,47 @@
+"""On-disk cache of immutable device metadata keyed by MAC address.
+
+Software/hardware revisions and serial are read from the band only once and
+then stored next to the `creds` file, so they survive process restarts.
+"""
+import os
+import json
+from typing import Any, Dict
+
+PATH = os.path.dirname(__file__) + "/meta.json"
+
+
+def _load_all() -> Dict[str, Dict[str, Any]]:
+    try:
+        with open(PATH) as file:
+            data = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _save_all(data: Dict[str, Dict[str, Any]]) -> None:
+    try:
+        with open(PATH, "w") as file:
+            json.dump(data, file)
+    except OSError:
+        # Cache is optional, band will be asked again next time.
+        pass
+
+
+def load(mac: str) -> Dict[str, Any]:
+    """Return cached metadata for given mac or empty dict."""
+    return dict(_load_all().get(mac.upper(), {}))
+
+
+def save(mac: str, meta: Dict[str, Any]) -> None:
+    """Store metadata for given mac."""
+    data = _load_all()
+    data[mac.upper()] = meta
+    _save_all(data)
+
+
+def invalidate(mac: str) -> None:
+    """Remove metadata for given mac, e.g. after firmware update."""
+    data = _load_all()
+    if data.pop(mac.upper(), None) is not None:
+        _save_all(data)
@@ -500,6 +500,16 @@ class Miband(Peripheral):
         return rate
 
     def start_heart_rate_realtime(self, heart_measure_callback):
+        self.enable_heart_rate_realtime(heart_measure_callback)
+        t = time.time()
+        while True:
+            self.poll_heart_rate_realtime(0.5)
+            # send ping request every 12 sec
+            if (time.time() - t) >= 12:
+                self.ping_heart_rate_realtime()
+                t = time.time()
+
+    def enable_heart_rate_realtime(self, heart_measure_callback):
         char_m = self.svc_heart.getCharacteristics(UUIDS.CHARACTERISTIC_HEART_RATE_MEASURE)[0]
         char_d = char_m.getDescriptors(forUUID=UUIDS.NOTIFICATION_DESCRIPTOR)[0]
         char_ctrl = self.svc_heart.getCharacteristics(UUIDS.CHARACTERISTIC_HEART_RATE_CONTROL)[0]
@@ -513,14 +523,16 @@ class Miband(Peripheral):
         char_d.write(b'\x01\x00', True)
         # start hear monitor continues
         char_ctrl.write(b'\x15\x01\x01', True)
-        t = time.time()
-        while True:
-            self.waitForNotifications(0.5)
-            self._parse_queue()
-            # send ping request every 12 sec
-            if (time.time() - t) >= 12:
-                char_ctrl.write(b'\x16', True)
-                t = time.time()
+
+    def poll_heart_rate_realtime(self, timeout):
+        # Single step of realtime heart rate loop, lets caller interleave
+        # other requests to the band between steps.
+        self.waitForNotifications(timeout)
+        self._parse_queue()
+
+    def ping_heart_rate_realtime(self):
+        # Band stops realtime heart rate measuring without ping request.
+        self._char_heart_ctrl.write(b'\x16', True)
 
 
     def stop_realtime(self):
@@ -5,68 +5,97 @@
 import time
 import shutil
 import subprocess
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
 
 from bluepy.btle import BTLEDisconnectError
 from cursesmenu import *
 from cursesmenu.items import *
 
+from . import _meta_cache
 from .constants import MUSICSTATE
 from .miband import Miband
 
     
+# Seconds to block waiting for band notifications in one call.
+NOTIFICATION_TIMEOUT = 5.0
+# Attempts to connect the band and max seconds to wait between them, delay
+# doubles after each failed attempt.
+CONNECT_ATTEMPTS = 8
+CONNECT_MAX_DELAY = 30
+# Absolute path of `notify-send` or None if it isn't installed.
+_NOTIFY_SEND = shutil.which("notify-send")
+# Band alert types for menu choices: mail, message, missed call, call.
+_ALERT_TYPES = (1, 5, 4, 3)
+
+
+def _notify_send(message: str) -> None:
+    """Show desktop notification without waiting for `notify-send` to exit,
+    so callbacks return to draining band notifications right away.
+    """
+    subprocess.Popen(
+        [_NOTIFY_SEND, message],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        close_fds=True)
+
+
 class MiConsole:
-    def __init__(self, mac: str, auth: str) -> None:
-        # Validate auth key.
-        if auth:
-            if 1 < len(auth) != 32:
-                print("Error:")
-                print("  Your AUTH KEY length is not 32, please check the format")
-                print("  Example of the Auth Key: 8fa9b42078627a654d22beff985655db")
-                exit(1)
+    # Menu items in order of appearance: label and name of the method to call.
+    _MENU = (
+        ("Get general info of the device", "general_info"),
+        ("@ Get Steps/Meters/Calories/Fat Burned", "get_step_count"),
+        ("Send Mail/ Call/ Missed Call/ Message", "send_notif"),
+        ("@ Get Heart Rate", "get_heart_rate"),
+        ("@ Get realtime heart rate data", "get_realtime"),
+        ("@ Get activity logs for a day", "get_activity_logs"),
+        ("@ Set the band's time to system time", "set_time"),
+        ("Set the band's music and receive music controls", "set_music"),
+        ("Listen for Device Lost notifications", "lost_device"),
+        ("@ Update Watchface", "update_watchface"),
+        ("@ Restore/Update Firmware", "restore_firmware"),
+    )
 
-        bytes_auth: bytes = bytes.fromhex(auth)
+    def __init__(self, mac: str, auth: bytes, debug: bool = False) -> None:
+        # Set by feature callbacks when the feature is logically finished.
+        self._done = threading.Event()
+
+        try:
+            self._connect(mac, auth, debug)
+        except KeyboardInterrupt:
+            print("\nExit.")
+            exit()
 
-        success = False
-        while not success:
-            try:
-                self.band = Miband(mac, bytes_auth, debug=True)
-                success = self.band.initialize()
-                break
-            except BTLEDisconnectError:
-                print('Connection to the MIBand failed. Trying out again in 3 seconds')
-                time.sleep(3)
-                continue
-            except KeyboardInterrupt:
-                print("\nExit.")
-                exit()
-            
         menu = CursesMenu("MIBand4", "Features marked with @ require Auth Key")
-        info_item = FunctionItem("Get general info of the device", self.general_info)
-        call_item = FunctionItem("Send Mail/ Call/ Missed Call/ Message", self.send_notif)
-        set_music_item = FunctionItem("Set the band's music and receive music controls", self.set_music)
-        lost_device_item = FunctionItem("Listen for Device Lost notifications", self.lost_device)
-        steps_item = FunctionItem("@ Get Steps/Meters/Calories/Fat Burned", self.get_step_count)
-        single_heart_rate_item = FunctionItem("@ Get Heart Rate", self.get_heart_rate)
-        real_time_heart_rate_item = FunctionItem("@ Get realtime heart rate data", self.get_realtime)
-        get_band_activity_data_item = FunctionItem("@ Get activity logs for a day", self.get_activity_logs)
-        set_time_item= FunctionItem("@ Set the band's time to system time", self.set_time)
-        update_watchface_item = FunctionItem("@ Update Watchface", self.update_watchface)
-        dfu_update_item = FunctionItem("@ Restore/Update Firmware", self.restore_firmware)
-        
-        menu.append_item(info_item)
-        menu.append_item(steps_item)
-        menu.append_item(call_item)
-        menu.append_item(single_heart_rate_item)
-        menu.append_item(real_time_heart_rate_item)
-        menu.append_item(get_band_activity_data_item)
-        menu.append_item(set_time_item)
-        menu.append_item(set_music_item)
-        menu.append_item(lost_device_item)
-        menu.append_item(update_watchface_item)
-        menu.append_item(dfu_update_item)
+        for label, method in self._MENU:
+            menu.append_item(FunctionItem(label, getattr(self, method)))
         menu.show()
 
+    def _connect(self, mac: str, auth: bytes, debug: bool) -> None:
+        for attempt in range(CONNECT_ATTEMPTS):
+            try:
+                self.band = Miband(mac, auth, debug=debug)
+                # Without auth key band can't be authenticated, but features
+                # not marked with @ still work.
+                if not auth or self.band.initialize():
+                    return
+            except BTLEDisconnectError:
+                if attempt == CONNECT_ATTEMPTS - 1:
+                    break
+                delay = min(CONNECT_MAX_DELAY, 2 ** attempt)
+                print(f'Connection to the MIBand failed. Trying out again in {delay} seconds')
+                time.sleep(delay)
+            else:
+                # Band is reachable but rejected auth, retrying won't help.
+                self.band.disconnect()
+                print("Error:")
+                print(f"  Authentication failed: {self.band.state}")
+                print("  Please check your AUTH KEY")
+                exit(1)
+        print(f"Couldn't connect to the MIBand in {CONNECT_ATTEMPTS} attempts")
+        exit(1)
+
     def get_step_count(self):
         binfo = self.band.get_steps()
         print('Number of steps: ', binfo['steps'])
@@ -77,9 +106,17 @@ class MiConsole:
 
     def general_info(self):
         print('MiBand')
-        print('Soft revision:', self.band.get_revision())
-        print('Hardware revision:', self.band.get_hrdw_revision())
-        print('Serial:', self.band.get_serial())
+        meta = _meta_cache.load(self.band.mac_address)
+        if "serial" not in meta:
+            meta = {
+                "software_revision": self.band.get_revision(),
+                "hardware_revision": self.band.get_hrdw_revision(),
+                "serial": self.band.get_serial()
+            }
+            _meta_cache.save(self.band.mac_address, meta)
+        print('Soft revision:', meta["software_revision"])
+        print('Hardware revision:', meta["hardware_revision"])
+        print('Serial:', meta["serial"])
         print('Battery:', self.band.get_battery_info()['level'])
         print('Time:', self.band.get_current_time()['date'].isoformat())
         input('Press a key to continue')
@@ -93,8 +130,7 @@ class MiConsole:
             print('Invalid choice')
             time.sleep(2)
             return
-        a=[1,5,4,3]
-        self.band.send_custom_alert(a[ty-1],title,msg)
+        self.band.send_custom_alert(_ALERT_TYPES[ty-1],title,msg)
 
     def get_heart_rate(self):
         print ('Latest heart rate is : %i' % self.band.get_heart_rate_one_time())
@@ -111,10 +147,12 @@ class MiConsole:
         print("This feature has the potential to brick your Mi Band 4. You are doing this at your own risk.")
         path = input("Enter the path of the firmware file :")
         self.band.dfuUpdate(path)
+        _meta_cache.invalidate(self.band.mac_address)
 
     def update_watchface(self):
         path = input("Enter the path of the watchface .bin file :")
         self.band.dfuUpdate(path)
+        _meta_cache.invalidate(self.band.mac_address)
 
     def set_time(self):
         now = datetime.now()
@@ -122,6 +160,7 @@ class MiConsole:
         self.band.set_current_time(now)
 
     def set_music(self): 
+        self._done.clear()
         self.band.setMusicCallback(
             self._default_music_play, 
             self._default_music_pause,
@@ -139,45 +178,59 @@ class MiConsole:
         fm = int(input("Set music position: "))
         fn = int(input("Set music duration: "))
         self.band.setTrack(MUSICSTATE.PLAYED,fi,fj,fk,fl,fm,fn)
-        while True:
-            if self.band.waitForNotifications(0.5):
-                continue
+        # Finished once music app is left on the band or user presses Enter.
+        self._pump_until_input('Press Enter to stop music controls')
+
+    def _pump_until_input(self, prompt):
+        # Drain band notifications in a worker thread, so they're handled
+        # while user is prompted. Stop once the feature is done or user
+        # enters anything.
+        pump = threading.Thread(target=self._pump, daemon=True)
+        pump.start()
+        input(prompt)
+        self._done.set()
+        pump.join()
+
+    def _pump(self):
+        while not self._done.is_set():
+            self.band.waitForNotifications(NOTIFICATION_TIMEOUT)
 
     def lost_device(self):
-        found = False
-        notify = shutil.which("notify-send") is not None
+        self._done.clear()
+        notify = _NOTIFY_SEND is not None
 
         def lost_device_callback():
             if notify:
-                subprocess.call(["notify-send", "Device Lost"])
+                _notify_send("Device Lost")
             else:
                 print("Searching for this device")
             print('Click on the icon on the band to stop searching')
 
         def found_device_callback():
-            nonlocal found
             if notify:
-                subprocess.call(["notify-send", "Found device"])
+                _notify_send("Found device")
             else:
                 print("Searching for this device")
-            found = True
+            self._done.set()
 
         self.band.setLostDeviceCallback(lost_device_callback, found_device_callback)
         print('Click "Lost Device" on the band')
-        while not found:
-            if self.band.waitForNotifications(0.5):
-                continue
-        input("enter any key")
+        self._pump_until_input("enter any key")
 
     def activity_log_callback(self, timestamp, c, i, s, h):
         print("{}: category: {}; intensity {}; steps {}; heart rate {};\n".format( timestamp.strftime('%d.%m - %H:%M'), c, i ,s ,h))
+        # Band sends logs minute by minute, the last one is just before the
+        # requested end.
+        if timestamp >= self.band.end_timestamp - timedelta(minutes=1):
+            self._done.set()
 
     def get_activity_logs(self):
         #gets activity log for this day.
-        temp = datetime.now()
-        self.band.get_activity_betwn_intervals(datetime(temp.year,temp.month,temp.day),datetime.now(), self.activity_log_callback)
-        while True:
-            self.band.waitForNotifications(0.2)
+        self._done.clear()
+        end = datetime.now()
+        start = datetime.combine(end.date(), datetime.min.time())
+        self.band.get_activity_betwn_intervals(start, end, self.activity_log_callback)
+        self._pump_until_input('Press a key to continue')
 
     def _default_music_play(self):
         print("Played")
@@ -201,4 +254,5 @@ class MiConsole:
         print("Music focus in")
 
     def _default_music_focus_out(self):
-        print("Music focus out")    
+        print("Music focus out")
+        self._done.set()    
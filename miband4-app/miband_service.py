@@ -1,14 +1,17 @@
 import os
 import time
+import statistics
+from collections import deque
 from functools import wraps
-from threading import Thread
-from typing import Any, List, Dict, Tuple, Callable
+from threading import Thread, RLock
+from typing import Any, List, Dict, Tuple, Callable, Optional
 
 from staze import Service, log
 from app.sensor import FloatSensor, Sensor
-from libs.miband4.miband4 import Miband as NativeMiband 
 from bluepy.btle import BTLEDisconnectError
 
+from app.miband import _creds, _meta_cache
+from app.miband.miband import Miband as NativeMiband
 from app.miband.freezed_miband_error import FreezedMibandError
 
 
@@ -17,24 +20,41 @@ def reconnect(func: Callable):
     
     So, after each request to Miband's method, band check and reconnect
     performed, or BTLEDisconnectError raised.
+
+    Calls are serialized, so only one decorated method talks to the band at
+    a time.
     """
     @wraps(func)
     def wrapper(*args, **kwargs):
         miband = MibandService.instance()
 
+        # Flags are read directly instead of `is_freezed` and `is_connected`
+        # since this path is hit by every request to the band.
         # Raise error if miband is freezed.
-        if miband.is_freezed():
+        if miband._is_frozen:
             raise FreezedMibandError("Cannot reconnect, miband is freezed.")
 
-        # Try to connect to miband if it's not connected.
-        if not miband.is_connected():
-            log.debug('Miband is not connected!!!')
-            miband.connect()
-        result = func(*args, **kwargs)
-        return result
+        with miband._band_lock:
+            # Try to connect to miband if it's not connected.
+            if not miband._connected:
+                log.debug('Miband is not connected!!!')
+                miband.connect()
+            return func(*args, **kwargs)
     return wrapper
 
 
+# Seconds to keep fetched battery charge before asking band again.
+BATTERY_CACHE_TTL = 60.0
+# Count of last pulse measurements to calculate median of.
+PULSE_BUFFER_SIZE = 16
+# Seconds the realtime pulse loop waits for notifications holding band lock.
+PULSE_WAIT_SLICE = 0.1
+# Seconds the realtime pulse loop sleeps without band lock between slices.
+PULSE_YIELD_INTERVAL = 0.01
+# Seconds between pings keeping realtime pulse measuring on band.
+PULSE_PING_INTERVAL = 12.0
+
+
 class MibandService(Service):
     """Represents actions with Miband4 fitness tracker.
     
@@ -46,123 +66,206 @@ class MibandService(Service):
         # Get and parse miband creds.
         # If the creds haven't been specified, freeze domain (dcu may not have
         # integrated miband).
-        self.mac_address = config.get("mac_address", "")
-        self.auth_key = config.get("auth_key", "")
+        mac_address = config.get("mac_address", "")
+        auth_key = config.get("auth_key", "")
 
         self.is_debug_mode = config.get("is_debug_mode", None)
         if self.is_debug_mode is None:
             self.is_debug_mode = False
 
-        # Validate MAC address.
-        if len(self.mac_address) != 17:
-            error_message = \
-                f'Given Miband4 MAC address {self.mac_address}' \
-                ' doesn\'t fit preserved format (len != 17)' 
-            raise ValueError(error_message)
-        # Validate Auth Key.
-        if len(self.auth_key) != 32:
-            error_message = \
-                f'Given Miband4 auth key {self.auth_key} doesn\'t fit' \
-                ' preserved format (len != 32)'
-            raise ValueError(error_message)
-        # Convert auth key from hex to byte format.
-        self.auth_key = bytes.fromhex(self.auth_key)
+        # Freeze state depends only on given miband creds and never changes.
+        self._is_frozen: bool = not mac_address or not auth_key
+
+        if self._is_frozen:
+            self.mac_address, self.auth_key = mac_address, b""
+        else:
+            # Validate creds and convert auth key from hex to byte format.
+            # Parsed creds are cached, so service re-creation doesn't repeat
+            # the work.
+            self.mac_address, self.auth_key = \
+                _creds.parse_creds(mac_address, auth_key)
+
+        self.band: Optional[NativeMiband] = None
+
+        # Info fetched from the band for the lifetime of the connection.
+        # Device revisions and serial are stored as is, battery charge as
+        # tuple `(value, expiry)` in terms of `time.monotonic()`.
+        self._info_cache: Dict[str, Any] = {}
+
+        # Serializes all I/O with the band: requests, connecting and each
+        # step of realtime pulse loop. The lock is reentrant since it's held
+        # by `reconnect` decorator while connecting.
+        self._band_lock = RLock()
+        # Only one realtime pulse thread may work with the band.
+        self._pulse_thread: Optional[Thread] = None
+
+        # Whether band is connected. Reset on disconnect, also by realtime
+        # pulse thread on band error.
+        self._connected: bool = False
+
+        # Last received pulse measurements, see `_get_pulse`.
+        self._pulse_buf: deque = deque(maxlen=PULSE_BUFFER_SIZE)
 
     def connect(self) -> None:
         """Connect miband or raise BTLEDDisconnectError."""
-        log.info("Connecting to miband...")
-        try:
-            self.band = NativeMiband(self.mac_address, self.auth_key, timeout=10)
-            self.band.initialize()
-        except BTLEDisconnectError:
-            # Disconnect band since disconnecting delete band and pulse
-            # attributes to make them unacessible.
+        with self._band_lock:
+            # Band may has been connected by other thread while this one was
+            # waiting for the lock.
+            if self.is_connected():
+                return
+
+            # Close previous band if it's still there and reset connection
+            # state, e.g. info cache.
             self.disconnect()
-            raise ValueError('Couldn\'t establish connection with miband4')
-        else:
-            log.info("Miband4 has been connected")
-            # Manually without decorator @reconnect manage to reconnect pulse
-            # and restart the realtime pulse grabbing.
-            self.connect()
-            self._thread_realtime_pulse()
+
+            log.info("Connecting to miband...")
+            try:
+                self.band = NativeMiband(
+                    self.mac_address, self.auth_key, timeout=10)
+                self.band.initialize()
+            except BTLEDisconnectError:
+                # Disconnect band to drop half-initialized connection and
+                # reset pulse.
+                self.disconnect()
+                raise ValueError('Couldn\'t establish connection with miband4')
+            else:
+                log.info("Miband4 has been connected")
+                self._connected = True
+                # Manually without decorator @reconnect restart the realtime
+                # pulse grabbing.
+                self._thread_realtime_pulse()
 
     def _thread_realtime_pulse(self) -> None:
-        log.info("Start realtime pulse")
-        Thread(target=self._start_realtime_pulse).start()
+        with self._band_lock:
+            if self._pulse_thread is not None and self._pulse_thread.is_alive():
+                return
+            log.info("Start realtime pulse")
+            self._pulse_thread = Thread(
+                target=self._start_realtime_pulse, args=(self.band,),
+                daemon=True)
+            self._pulse_thread.start()
+
+    def _start_realtime_pulse(self, band: NativeMiband) -> None:
+        """Receive realtime pulse from given band until it's disconnected.
 
-    def _start_realtime_pulse(self) -> None:
-        self.band.start_heart_rate_realtime(
-            heart_measure_callback=self.set_pulse)
+        Band lock is held only for a single wait slice, so requests to the
+        band are handled between slices.
+        """
+        try:
+            with self._band_lock:
+                if self.band is not band:
+                    return
+                band.enable_heart_rate_realtime(
+                    heart_measure_callback=self.set_pulse)
+            pinged_at = time.monotonic()
+            while True:
+                with self._band_lock:
+                    # Band has been disconnected or replaced meanwhile.
+                    if self.band is not band:
+                        return
+                    band.poll_heart_rate_realtime(PULSE_WAIT_SLICE)
+                    if time.monotonic() - pinged_at >= PULSE_PING_INTERVAL:
+                        band.ping_heart_rate_realtime()
+                        pinged_at = time.monotonic()
+                # Give waiting requests a chance to take the lock.
+                time.sleep(PULSE_YIELD_INTERVAL)
+        except Exception as error:
+            # Any error leaves the band in unknown state, e.g. interleaved
+            # response or broken notification, so drop the connection.
+            log.error(f"Miband error, stop realtime pulse: {error!r}")
+            with self._band_lock:
+                # Next request through `reconnect` decorator will connect
+                # again.
+                if self.band is band:
+                    self.disconnect()
 
     def disconnect(self) -> None:
         """Set state of band to disconnected."""
-        # Two different try-except blocks for guarantee to clear all related
-        # attributes.
-        try:
-            del self.band
-        except AttributeError:
-            pass
-        try:
-            del self.pulse
-        except AttributeError:
-            pass
+        self._connected = False
+        band = self.band
+        if band is not None:
+            # Disconnect band explicitly, otherwise it would be unavailable
+            # for the next connection until the link supervision timeout.
+            try:
+                band.disconnect()
+            except Exception:
+                pass
+            self.band = None
+        # Realtime pulse thread of the dropped band stops by itself.
+        self._pulse_thread = None
+        self._pulse_buf.clear()
+        self._info_cache.clear()
 
     def is_freezed(self) -> bool:
-        """Return True if domain received creds and able to work,
+        """Return True if domain hasn't received creds and unable to work,
         False otherwise.
         """
-        # Now freeze state depends only on given miband creds.
-        # Simply said, if creds are given, domain works.
-        return not self.mac_address or not self.auth_key
+        return self._is_frozen
 
     @reconnect
     def get_pulse(self) -> Sensor:
         return FloatSensor(token='pulse', value=float(self._get_pulse()))
 
-    def _get_pulse(self) -> int:
-        """Process pulse from miband4 and return it."""
-        try:
-            return self.pulse
-        except AttributeError:
+    def _get_pulse(self) -> float:
+        """Process pulse from miband4 and return it.
+
+        Pulse is a median of last `PULSE_BUFFER_SIZE` measurements to smooth
+        noisy values.
+        """
+        if not self._pulse_buf:
             raise AttributeError(
                 "Miband hasn't received any pulse data yet")
+        return statistics.median(self._pulse_buf)
 
     def set_pulse(self, value: int) -> None:
         """Set pulse.
 
         Generally used by miband realtime pulse callback.
         """
-        # TODO: Implement array of X last measurements with medium value
-        # calculating.
         log.info(f"Receive pulse: {value}")
-        self.pulse = value
+        self._pulse_buf.append(value)
 
     @reconnect
     def get_info(self) -> Dict[str, Any]:
         """Map and return general info in dict format."""
+        # Revisions and serial never change for the device, so fetch them
+        # once and keep both per connection and on disk.
+        if "serial" not in self._info_cache:
+            meta = _meta_cache.load(self.mac_address)
+            if "serial" not in meta:
+                meta = {
+                    "software_revision": self.band.get_revision(),
+                    "hardware_revision": self.band.get_hrdw_revision(),
+                    "serial": self.band.get_serial()
+                }
+                _meta_cache.save(self.mac_address, meta)
+            self._info_cache.update(meta)
         info = {
             "name": "miband4",
-            "software_revision": self.band.get_revision(),
-            "hardware_revision": self.band.get_hrdw_revision(),
-            "serial": self.band.get_serial(),
+            "software_revision": self._info_cache["software_revision"],
+            "hardware_revision": self._info_cache["hardware_revision"],
+            "serial": self._info_cache["serial"],
             "battery_charge": self.get_battery_charge(),
             "device_time": self.band.get_current_time()["date"].isoformat()
         }
         return info
 
     def get_battery_charge(self) -> float:
-        """Process battery charge from miband and return it."""
-        return self.band.get_battery_info()["level"]
+        """Process battery charge from miband and return it.
+
+        Charge is cached for `BATTERY_CACHE_TTL` seconds since it changes
+        slowly.
+        """
+        value, expiry = self._info_cache.get("battery", (None, 0.0))
+        if value is None or time.monotonic() >= expiry:
+            value = self.band.get_battery_info()["level"]
+            self._info_cache["battery"] = (
+                value, time.monotonic() + BATTERY_CACHE_TTL)
+        return value
 
     def is_connected(self) -> bool:
         """Check whether band connected and return bool."""
-        try:
-            self.band
-        except AttributeError:
-            # self.band is not defined.
-            return False
-        else:
-            return True
+        return self._connected
 
     def send_message(self, message: str) -> None:
         if len(message) > 0:
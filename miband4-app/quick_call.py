@@ -6,10 +6,10 @@ from bluepy.btle import BTLEDisconnectError
 from .miband import Miband
 
 
-def call_quick(mac: str) -> None:
+def call_quick(mac: str, debug: bool = False) -> None:
     while True :
         try:
-            band = Miband(mac, debug=True)
+            band = Miband(mac, debug=debug)
             band.send_custom_alert(3, "123", "test")
             band.waitForNotifications(10)
             band.disconnect()